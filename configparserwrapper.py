@@ -2,13 +2,15 @@ __author__ = 'Peter Hofmann'
 __version__ = '0.1.3'
 
 import os
+import re
+import hashlib
 import sys
 from collections import Iterable
 from io import StringIO
 if sys.version_info < (3,):
-    from ConfigParser import SafeConfigParser as ConfigParser
+    from ConfigParser import SafeConfigParser as ConfigParser, DEFAULTSECT
 else:
-    from configparser import ConfigParser
+    from configparser import ConfigParser, DEFAULTSECT
 from scripts.loggingwrapper import DefaultLogging
 
 
@@ -22,6 +24,8 @@ class ConfigParserWrapper(DefaultLogging):
         'no': False, 'false': False, 'off': False,
         'y': True, 't': True, 'n': False, 'f': False}
 
+    _re_interpolation = re.compile(r"%\(([^)]+)\)s")
+
     def __init__(self, logfile=None, verbose=True):
         """
             Wrapper for the SafeConfigParser class for easy use.
@@ -40,6 +44,10 @@ class ConfigParserWrapper(DefaultLogging):
             label="ConfigParserWrapper", logfile=logfile, verbose=verbose)
         self._config = ConfigParser()
         self._config_file_path = None
+        self._interpolation_cache = {}
+        self._dependents = {}
+        self._section_digests = {}
+        self._source_states = {}
 
     def read(self, config_file):
         """
@@ -69,6 +77,42 @@ class ConfigParserWrapper(DefaultLogging):
         else:
             self._logger.error("Invalid config file argument '{}'".format(config_file))
             raise Exception("Unknown argument")
+        self._clear_interpolation_cache()
+        self._section_digests = {}
+
+    def read_source(self, source):
+        """
+            Read all configuration files of a source into a new configuration replacing the current one,
+            if the source changed since this wrapper last read it.
+
+            @attention: streams are parsed as they are fetched, without temporary files.
+            On failure the current configuration is kept.
+
+            @param source: directory, archive or http source of module configsource (Python 3 only)
+            @type source: configsource.ConfigSource
+
+            @return: True if the source was read, False if unchanged
+            @rtype: bool
+        """
+        assert callable(getattr(source, "fetch", None)), "Invalid config source: {}".format(source)
+        config = ConfigParser()
+        try:
+            state, streams = source.fetch(self._source_states.get(source))
+            if streams is None:
+                return False
+            for name, stream in streams:
+                config.read_file(stream, name)
+        except Exception:
+            # fetch unconditionally next time
+            self._source_states.pop(source, None)
+            self._logger.error("Failed to read config source '{}'".format(source.name))
+            raise
+        self._config = config
+        self._config_file_path = source.name
+        self._source_states[source] = state
+        self._clear_interpolation_cache()
+        self._section_digests = {}
+        return True
 
     def write(self, file_path):
         """
@@ -84,6 +128,7 @@ class ConfigParserWrapper(DefaultLogging):
 
     def set_value(self, option, value, section=None):
         """
+            Set the value of an option, cached values depending on it are invalidated.
 
         @param section:
         @type section: str
@@ -92,9 +137,182 @@ class ConfigParserWrapper(DefaultLogging):
 
         @rtype: None
         """
-        if not self._config.has_section(section):
+        if section != DEFAULTSECT and not self._config.has_section(section):
             self._config.add_section(section)
         self._config.set(section, option, value)
+        self._invalidate(section, option)
+        self._section_digests.pop(section, None)
+
+    def _clear_interpolation_cache(self):
+        """
+            Drop all cached interpolated values and their dependencies.
+
+            @rtype: None
+        """
+        self._interpolation_cache = {}
+        self._dependents = {}
+
+    def _invalidate(self, section, option):
+        """
+            Remove the cached value of an option and of all values depending on it.
+
+            @param section: name of section
+            @type section: str
+            @param option: name of option in a section
+            @type option: str
+
+            @rtype: None
+        """
+        if section == DEFAULTSECT:
+            # defaults are visible in every section
+            self._clear_interpolation_cache()
+            return
+        key = (section, self._config.optionxform(option))
+        self._interpolation_cache.pop(key, None)
+        for dependent in self._dependents.pop(key, ()):
+            self._interpolation_cache.pop(dependent, None)
+
+    def _get_dependencies(self, section, option):
+        """
+            get all options a value refers to, directly or through other references.
+
+            @param section: name of section
+            @type section: str
+            @param option: name of option in a section
+            @type option: str
+
+            @return: set of (section, option) keys
+            @rtype: set[(str, str)]
+        """
+        dependencies = set()
+        stack = [option]
+        while stack:
+            current = stack.pop()
+            if not self._config.has_option(section, current):
+                continue
+            raw_value = self._config.get(section, current, raw=True)
+            for reference in self._re_interpolation.findall(raw_value):
+                key = (section, self._config.optionxform(reference))
+                if key in dependencies:
+                    continue
+                dependencies.add(key)
+                stack.append(key[1])
+        return dependencies
+
+    def _get_interpolated(self, section, option):
+        """
+            get the interpolated value of an option, served from cache if available.
+
+            @param section: name of section
+            @type section: str
+            @param option: name of option in a section
+            @type option: str
+
+            @return: interpolated value
+            @rtype: str
+        """
+        key = (section, self._config.optionxform(option))
+        if key in self._interpolation_cache:
+            return self._interpolation_cache[key]
+        value = self._config.get(section, option)
+        for dependency in self._get_dependencies(section, option):
+            if dependency == key:
+                continue
+            self._dependents.setdefault(dependency, set()).add(key)
+        self._interpolation_cache[key] = value
+        return value
+
+    def _get_section_items(self, section):
+        """
+            get the raw options a section defines itself, without inherited defaults.
+
+            @param section: name of section
+            @type section: str
+
+            @return: option names and raw values
+            @rtype: dict[str, str]
+        """
+        if section == DEFAULTSECT:
+            return self._config.defaults()
+        # python 2 stores the section name as option '__name__'
+        return dict((option, value) for option, value in self._config._sections[section].items() if option != "__name__")
+
+    def _get_section_digest(self, section):
+        """
+            get a digest of the raw options a section defines itself.
+
+            @param section: name of section
+            @type section: str
+
+            @return: hex digest
+            @rtype: str
+        """
+        if section not in self._section_digests:
+            digest = hashlib.md5()
+            for option, value in sorted(self._get_section_items(section).items()):
+                digest.update("{}\0{}\0".format(option, value).encode("utf-8"))
+            self._section_digests[section] = digest.hexdigest()
+        return self._section_digests[section]
+
+    def get_digest(self):
+        """
+            get a digest of the whole configuration.
+
+            @return: hex digest
+            @rtype: str
+        """
+        digest = hashlib.md5()
+        for section in [DEFAULTSECT] + sorted(self._config.sections()):
+            digest.update("{}\0{}\0".format(section, self._get_section_digest(section)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def has_changed(self, other):
+        """
+            Cheap check if another configuration differs from this one.
+
+            @param other: configuration to compare with
+            @type other: ConfigParserWrapper
+
+            @return: True if any section or option differs
+            @rtype: bool
+        """
+        assert isinstance(other, ConfigParserWrapper), "Invalid argument, 'other' must be ConfigParserWrapper, but got: '{}'".format(type(other))
+        return self.get_digest() != other.get_digest()
+
+    def diff(self, other):
+        """
+            Compare raw values with another configuration, sections with equal digests are skipped.
+
+            @param other: configuration to compare with
+            @type other: ConfigParserWrapper
+
+            @attention: options of the DEFAULT section are reported with section 'DEFAULT'.
+
+            @return: (section, option) keys only in other, only in self and with differing values
+            @rtype: dict[str, set[(str, str)]]
+        """
+        assert isinstance(other, ConfigParserWrapper), "Invalid argument, 'other' must be ConfigParserWrapper, but got: '{}'".format(type(other))
+        result = {"added": set(), "removed": set(), "changed": set()}
+        sections = set(self._config.sections())
+        other_sections = set(other._config.sections())
+        for section in other_sections - sections:
+            result["added"].update((section, option) for option in other._get_section_items(section))
+        for section in sections - other_sections:
+            result["removed"].update((section, option) for option in self._get_section_items(section))
+        for section in [DEFAULTSECT] + list(sections & other_sections):
+            if self._get_section_digest(section) == other._get_section_digest(section):
+                continue
+            items = self._get_section_items(section)
+            other_items = other._get_section_items(section)
+            for option, value in other_items.items():
+                if option not in items:
+                    result["added"].add((section, option))
+                elif items[option] != value:
+                    result["changed"].add((section, option))
+            for option in items:
+                if option not in other_items:
+                    result["removed"].add((section, option))
+        return result
 
     def validate_sections(self, list_sections):
         """
@@ -172,7 +390,7 @@ class ConfigParserWrapper(DefaultLogging):
                 self._logger.error("Missing option '{}' in section '{}'".format(option, section))
             return None
 
-        value = self._config.get(section, option)
+        value = self._get_interpolated(section, option)
         if value == '':
             if not silent:
                 self._logger.warning("Empty value in '{}': '{}'".format(section, option))
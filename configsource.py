@@ -0,0 +1,365 @@
+__author__ = 'Peter Hofmann'
+__version__ = '0.0.1'
+
+import io
+import os
+import tarfile
+import zipfile
+import fnmatch
+import threading
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+
+
+class ConfigSource(object):
+    """
+    Abstract base class of sources a ConfigParserWrapper can read from, subclasses implement fetch().
+
+    @attention: Python 3 only.
+
+    @type name: str
+    """
+
+    def __init__(self, name):
+        """
+            @param name: name of the source, used as config file path
+            @type name: str
+
+            @return: None
+            @rtype: None
+        """
+        assert isinstance(name, str), "Invalid argument, 'name' must be string, but got: '{}'".format(type(name))
+        self.name = name
+
+    def fetch(self, state=None):
+        """
+            Fetch all config files, unless unchanged since the fetch that returned 'state'.
+
+            @attention: streams are only valid until the next item is requested.
+
+            @param state: state returned by a previous fetch, None to fetch unconditionally
+            @type state: any
+
+            @return: new state and generator of (name, stream), None instead of a generator if unchanged
+            @rtype: (any, collections.Iterable[(str, TextIOWrapper)] | None)
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _decode(stream):
+        """
+            Wrap a binary stream to be read as text without buffering its whole content.
+
+            @attention: line endings are handled like by open(), so streams parse the same as files.
+
+            @param stream: binary stream
+            @type stream: BufferedIOBase
+
+            @rtype: TextIOWrapper
+        """
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+class DirectorySource(ConfigSource):
+    """
+    All config files of a directory, read in alphabetical order.
+    """
+
+    def __init__(self, directory, pattern="*.cfg"):
+        """
+            @param directory: path to a directory
+            @type directory: str
+            @param pattern: shell pattern of file names to read
+            @type pattern: str
+
+            @return: None
+            @rtype: None
+        """
+        assert os.path.isdir(directory), "Invalid directory: '{}'".format(directory)
+        super(DirectorySource, self).__init__(directory)
+        self._pattern = pattern
+
+    def _get_file_paths(self):
+        """
+            @return: sorted list of file paths
+            @rtype: list[str]
+        """
+        file_names = fnmatch.filter(os.listdir(self.name), self._pattern)
+        file_paths = [os.path.join(self.name, file_name) for file_name in sorted(file_names)]
+        return [file_path for file_path in file_paths if os.path.isfile(file_path)]
+
+    def fetch(self, state=None):
+        """
+            Fetch all matching files, unless no file was added, removed or modified.
+
+            @param state: state returned by a previous fetch, None to fetch unconditionally
+            @type state: tuple | None
+
+            @return: file paths with mtime and generator of (file path, stream), None instead of a generator if unchanged
+            @rtype: (tuple, collections.Iterable[(str, TextIOWrapper)] | None)
+        """
+        file_paths = self._get_file_paths()
+        new_state = tuple((file_path, os.path.getmtime(file_path)) for file_path in file_paths)
+        if new_state == state:
+            return state, None
+        return new_state, self._open(file_paths)
+
+    def _open(self, file_paths):
+        """
+            @param file_paths: files to read
+            @type file_paths: list[str]
+
+            @return: generator of (file path, stream)
+            @rtype: collections.Iterable[(str, TextIOWrapper)]
+        """
+        for file_path in file_paths:
+            with io.open(file_path, "rb") as read_handler:
+                yield file_path, self._decode(read_handler)
+
+
+class ArchiveSource(ConfigSource):
+    """
+    All config files of a tar or zip archive, read in alphabetical order.
+    """
+
+    def __init__(self, file_path, pattern="*.cfg"):
+        """
+            @param file_path: path to a tar or zip archive
+            @type file_path: str
+            @param pattern: shell pattern of member names to read
+            @type pattern: str
+
+            @return: None
+            @rtype: None
+        """
+        assert os.path.isfile(file_path), "Invalid archive: '{}'".format(file_path)
+        super(ArchiveSource, self).__init__(file_path)
+        self._pattern = pattern
+
+    def fetch(self, state=None):
+        """
+            Fetch all matching members, unless the archive was not modified.
+
+            @param state: state returned by a previous fetch, None to fetch unconditionally
+            @type state: float | None
+
+            @return: archive mtime and generator of (archive path/member name, stream), None instead of a generator if unchanged
+            @rtype: (float, collections.Iterable[(str, TextIOWrapper)] | None)
+        """
+        new_state = os.path.getmtime(self.name)
+        if new_state == state:
+            return state, None
+        return new_state, self._open()
+
+    def _open(self):
+        """
+            @return: generator of (archive path/member name, stream)
+            @rtype: collections.Iterable[(str, TextIOWrapper)]
+        """
+        if zipfile.is_zipfile(self.name):
+            with zipfile.ZipFile(self.name) as archive:
+                for member in sorted(archive.namelist()):
+                    if member.endswith('/') or not fnmatch.fnmatch(member, self._pattern):
+                        continue
+                    member_handler = archive.open(member)
+                    try:
+                        yield "{}/{}".format(self.name, member), self._decode(member_handler)
+                    finally:
+                        member_handler.close()
+        elif tarfile.is_tarfile(self.name):
+            with tarfile.open(self.name) as archive:
+                members = [member for member in archive.getmembers() if member.isfile()]
+                for member in sorted(members, key=lambda item: item.name):
+                    if not fnmatch.fnmatch(member.name, self._pattern):
+                        continue
+                    yield "{}/{}".format(self.name, member.name), self._decode(archive.extractfile(member))
+        else:
+            raise Exception("Unknown archive format: '{}'".format(self.name))
+
+
+class HTTPConnectionPool(object):
+    """
+    Keep-alive connections, reused per scheme, host and port, safe to share between threads.
+    """
+
+    def __init__(self, max_size=4, timeout=10):
+        """
+            @param max_size: maximum of idle connections kept per host
+            @type max_size: int
+            @param timeout: socket timeout in seconds
+            @type timeout: int | float
+
+            @return: None
+            @rtype: None
+        """
+        assert isinstance(max_size, int), "Invalid argument, 'max_size' must be int, but got: '{}'".format(type(max_size))
+        self._max_size = max_size
+        self._timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        """
+            get an idle connection or a new one.
+
+            @param scheme: 'http' or 'https'
+            @type scheme: str
+            @param netloc: host and optional port
+            @type netloc: str
+
+            @return: connection and if it was taken from the pool
+            @rtype: (HTTPConnection, bool)
+        """
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        if scheme == "https":
+            return HTTPSConnection(netloc, timeout=self._timeout), False
+        return HTTPConnection(netloc, timeout=self._timeout), False
+
+    def release(self, scheme, netloc, connection):
+        """
+            Return a connection to the pool, once its response has been read completely.
+
+            @rtype: None
+        """
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self._max_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """
+            Close all idle connections.
+
+            @rtype: None
+        """
+        with self._lock:
+            idle_connections = self._idle
+            self._idle = {}
+        for idle in idle_connections.values():
+            for connection in idle:
+                connection.close()
+
+
+class HTTPSource(ConfigSource):
+    """
+    A config file served by a http endpoint, fetched conditionally by ETag or Last-Modified.
+    """
+
+    _default_pool = HTTPConnectionPool()
+
+    def __init__(self, url, pool=None):
+        """
+            @param url: 'http://' or 'https://' url of a config file
+            @type url: str
+            @param pool: connection pool, one shared by all sources by default
+            @type pool: HTTPConnectionPool | None
+
+            @return: None
+            @rtype: None
+        """
+        super(HTTPSource, self).__init__(url)
+        self._url = urlsplit(url)
+        assert self._url.scheme in ("http", "https"), "Invalid url: '{}'".format(url)
+        assert pool is None or isinstance(pool, HTTPConnectionPool), "Invalid pool: '{}'".format(pool)
+        if pool is None:
+            pool = HTTPSource._default_pool
+        self._pool = pool
+
+    def _request(self, state):
+        """
+            Send a conditional GET request, retrying once if a pooled connection was closed by the server.
+
+            @param state: ETag and Last-Modified of a previous response, None for an unconditional request
+            @type state: (str | None, str | None) | None
+
+            @return: connection and response
+            @rtype: (HTTPConnection, HTTPResponse)
+        """
+        path = self._url.path or "/"
+        if self._url.query:
+            path = "{}?{}".format(path, self._url.query)
+        headers = {}
+        if state is not None:
+            etag, last_modified = state
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+        while True:
+            connection, is_reused = self._pool.get(self._url.scheme, self._url.netloc)
+            try:
+                connection.request("GET", path, headers=headers)
+                return connection, connection.getresponse()
+            except Exception:
+                connection.close()
+                if not is_reused:
+                    raise
+
+    def fetch(self, state=None):
+        """
+            Fetch the config file, unless the server answers 304 Not Modified.
+
+            @attention: the connection is returned to the pool once the generator is exhausted.
+
+            @param state: state returned by a previous fetch, None to fetch unconditionally
+            @type state: (str | None, str | None) | None
+
+            @return: ETag and Last-Modified and generator of (url, stream), None instead of a generator if unchanged
+            @rtype: ((str | None, str | None) | None, collections.Iterable[(str, TextIOWrapper)] | None)
+        """
+        connection, response = self._request(state)
+        if response.status == 304:
+            self._release(connection, response)
+            return state, None
+        if response.status != 200:
+            connection.close()
+            raise Exception("Failed to fetch '{}': {} {}".format(self.name, response.status, response.reason))
+        new_state = (response.getheader("ETag"), response.getheader("Last-Modified"))
+        if new_state == (None, None):
+            new_state = None
+        return new_state, self._open(connection, response)
+
+    def _open(self, connection, response):
+        """
+            @param connection: connection the response was received on
+            @type connection: HTTPConnection
+            @param response: response with status 200
+            @type response: HTTPResponse
+
+            @return: generator of (url, stream)
+            @rtype: collections.Iterable[(str, TextIOWrapper)]
+        """
+        is_complete = False
+        text_stream = self._decode(response)
+        try:
+            yield self.name, text_stream
+            is_complete = True
+        finally:
+            # keep the response open, it is drained before the connection is reused
+            text_stream.detach()
+            if is_complete:
+                self._release(connection, response)
+            else:
+                connection.close()
+
+    def _release(self, connection, response):
+        """
+            Drain a response and return its connection to the pool, unless the server closes it.
+
+            @param connection: connection the response was received on
+            @type connection: HTTPConnection
+            @param response: response
+            @type response: HTTPResponse
+
+            @rtype: None
+        """
+        response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self._pool.release(self._url.scheme, self._url.netloc, connection)
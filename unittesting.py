@@ -1,8 +1,16 @@
 __author__ = 'hofmann'
 
+import io
 import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
 import unittest
+import threading
 from configparserwrapper import ConfigParserWrapper
+from configsource import DirectorySource, ArchiveSource, HTTPSource, HTTPConnectionPool
+from http.server import HTTPServer, BaseHTTPRequestHandler
 
 
 class DefaultConfigParserWrapper(unittest.TestCase):
@@ -79,7 +87,261 @@ class TestConfigParserMethods(DefaultConfigParserWrapper):
             section, options, kargs, assertion, expected_result = test
             assertion(self.cfg.get_value(section, options, **kargs), expected_result)
 
+    def _count_interpolations(self):
+        """
+            Count calls of ConfigParser.get that interpolate a value.
+
+            @rtype: list[(str, str)]
+        """
+        interpolations = []
+        get = self.cfg._config.get
+
+        def counting_get(section, option, **kwargs):
+            if not kwargs.get("raw"):
+                interpolations.append((section, option))
+            return get(section, option, **kwargs)
+        self.cfg._config.get = counting_get
+        return interpolations
+
+    def test_interpolation_cache(self):
+        interpolations = self._count_interpolations()
+        self.cfg.set_value("base", "/data", "interpolation")
+        self.cfg.set_value("middle", "%(base)s/middle", "interpolation")
+        self.cfg.set_value("top", "%(middle)s/top", "interpolation")
+        self.cfg.set_value("other", "other", "interpolation")
+        self.assertEqual(self.cfg.get_value("top", "interpolation"), "/data/middle/top")
+        self.assertEqual(self.cfg.get_value("other", "interpolation"), "other")
+        self.assertEqual(len(interpolations), 2)
+        self.assertEqual(self.cfg.get_value("top", "interpolation"), "/data/middle/top")
+        self.assertEqual(len(interpolations), 2)
+
+        self.cfg.set_value("base", "/tmp", "interpolation")
+        self.assertEqual(self.cfg.get_value("other", "interpolation"), "other")
+        self.assertEqual(len(interpolations), 2)
+        self.assertEqual(self.cfg.get_value("top", "interpolation"), "/tmp/middle/top")
+        self.assertEqual(interpolations[2:], [("interpolation", "top")])
+        self.assertEqual(self.cfg.get_value("middle", "interpolation"), "/tmp/middle")
+
+        self.cfg.set_value("middle", "%(other)s", "interpolation")
+        self.assertEqual(self.cfg.get_value("top", "interpolation"), "other/top")
+        self.cfg.set_value("other", "changed", "interpolation")
+        self.assertEqual(self.cfg.get_value("top", "interpolation"), "changed/top")
+
+    def test_interpolation_cache_default(self):
+        interpolations = self._count_interpolations()
+        self.cfg.set_value("root", "/data", "DEFAULT")
+        self.cfg.set_value("directory", "%(root)s/project", "interpolation")
+        self.assertEqual(self.cfg.get_value("directory", "interpolation"), "/data/project")
+        self.assertEqual(self.cfg.get_value("directory", "interpolation"), "/data/project")
+        self.assertEqual(len(interpolations), 1)
+        self.cfg.set_value("root", "/tmp", "DEFAULT")
+        self.assertEqual(self.cfg.get_value("directory", "interpolation"), "/tmp/project")
+        self.assertEqual(len(interpolations), 2)
+        self.cfg.set_value("root", "/home", "interpolation")
+        self.assertEqual(self.cfg.get_value("directory", "interpolation"), "/home/project")
+
+    def test_diff(self):
+        other = ConfigParserWrapper(logfile=DefaultConfigParserWrapper.log_file_path, verbose=False)
+        other.read(DefaultConfigParserWrapper.test_config)
+        self.assertFalse(self.cfg.has_changed(other))
+        self.assertEqual(self.cfg.diff(other), {"added": set(), "removed": set(), "changed": set()})
+
+        other.set_value("string", "other string", "values")
+        other.set_value("new", "1", "values")
+        other.set_value("option", "1", "new_section")
+        self.cfg.set_value("old", "1", "path")
+        self.assertTrue(self.cfg.has_changed(other))
+        result = self.cfg.diff(other)
+        self.assertEqual(result["added"], {("values", "new"), ("new_section", "option")})
+        self.assertEqual(result["removed"], {("path", "old")})
+        self.assertEqual(result["changed"], {("values", "string")})
+
+    def test_diff_default(self):
+        cfg = ConfigParserWrapper(logfile=DefaultConfigParserWrapper.log_file_path, verbose=False)
+        other = ConfigParserWrapper(logfile=DefaultConfigParserWrapper.log_file_path, verbose=False)
+        self.assertFalse(cfg.has_changed(other))
+        other.set_value("x", "1", "DEFAULT")
+        self.assertTrue(cfg.has_changed(other))
+        self.assertEqual(cfg.diff(other), {"added": {("DEFAULT", "x")}, "removed": set(), "changed": set()})
+
+        cfg.set_value("y", "1", "DEFAULT")
+        other.set_value("y", "2", "DEFAULT")
+        for wrapper in [cfg, other]:
+            wrapper.set_value("a", "1", "s1")
+            wrapper.set_value("y", "3", "s2")
+        self.assertEqual(cfg._get_section_digest("s1"), other._get_section_digest("s1"))
+        self.assertEqual(cfg._get_section_digest("s2"), other._get_section_digest("s2"))
+        self.assertEqual(cfg.diff(other), {"added": {("DEFAULT", "x")}, "removed": set(), "changed": {("DEFAULT", "y")}})
+
+        other.set_value("y", "4", "s2")
+        self.assertEqual(cfg.diff(other)["changed"], {("DEFAULT", "y"), ("s2", "y")})
+        other.set_value("b", "1", "s3")
+        self.assertEqual(cfg.diff(other)["added"], {("DEFAULT", "x"), ("s3", "b")})
+
+
+class ConfigHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    etag = '"1"'
+    status = 200
+    drop_connection = False
+
+    def do_GET(self):
+        if ConfigHandler.status != 200:
+            self.send_response(ConfigHandler.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ConfigHandler.etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(DefaultConfigParserWrapper.test_config, "rb") as read_handler:
+            content = read_handler.read()
+        self.send_response(200)
+        self.send_header("ETag", ConfigHandler.etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        # close a keep-alive connection without telling the client, like an idle timeout would
+        self.close_connection = ConfigHandler.drop_connection
+
+    def log_message(self, *args):
+        pass
+
+
+class TestConfigSources(unittest.TestCase):
+    log_file_path = 'unittest_log.txt'
+
+    def setUp(self):
+        self.cfg = ConfigParserWrapper(logfile=TestConfigSources.log_file_path, verbose=False)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.cfg = None
+        shutil.rmtree(self.directory)
+        if os.path.exists(TestConfigSources.log_file_path):
+            os.remove(TestConfigSources.log_file_path)
+
+    def _write_config(self, file_path, value, mtime, section="values"):
+        with open(file_path, "w") as write_handler:
+            write_handler.write("[{}]\nstring={}\n".format(section, value))
+        os.utime(file_path, (mtime, mtime))
+
+    def _start_server(self):
+        ConfigHandler.etag = '"1"'
+        ConfigHandler.status = 200
+        ConfigHandler.drop_connection = False
+        server = HTTPServer(("127.0.0.1", 0), ConfigHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop_server():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.addCleanup(stop_server)
+        pool = HTTPConnectionPool()
+        self.addCleanup(pool.close)
+        return HTTPSource("http://127.0.0.1:{}/a.cfg".format(server.server_port), pool), pool
+
+    def test_source_line_breaks(self):
+        file_path = os.path.join(self.directory, "a.cfg")
+        with io.open(file_path, "w", encoding="utf-8") as write_handler:
+            write_handler.write(u"[values]\nform_feed=x\x0cy\nseparator=x\u2028y\n")
+        cfg = ConfigParserWrapper(logfile=TestConfigSources.log_file_path, verbose=False)
+        cfg.read(file_path)
+        self.assertTrue(self.cfg.read_source(DirectorySource(self.directory)))
+        for option in ["form_feed", "separator"]:
+            self.assertEqual(self.cfg.get_value(option, "values"), cfg.get_value(option, "values"))
+
+    def test_directory_source(self):
+        file_path = os.path.join(self.directory, "a.cfg")
+        self._write_config(file_path, "first", 1000000000)
+        source = DirectorySource(self.directory)
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("string", "values"), "first")
+        self.assertFalse(self.cfg.read_source(source))
+
+        self._write_config(file_path, "second", 1000000010)
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("string", "values"), "second")
+
+        # a reload replaces the configuration, options of removed files are gone
+        os.remove(file_path)
+        self._write_config(os.path.join(self.directory, "b.cfg"), "third", 1000000020, "other")
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.validate_sections(["values"]), ["values"])
+        self.assertEqual(self.cfg.get_value("string", "other"), "third")
+
+    def test_source_shared_by_wrappers(self):
+        self._write_config(os.path.join(self.directory, "a.cfg"), "first", 1000000000)
+        source = DirectorySource(self.directory)
+        self.assertTrue(self.cfg.read_source(source))
+        candidate = ConfigParserWrapper(logfile=TestConfigSources.log_file_path, verbose=False)
+        self.assertTrue(candidate.read_source(source))
+        self.assertFalse(self.cfg.has_changed(candidate))
+        self.assertFalse(candidate.read_source(source))
+
+    def test_archive_source(self):
+        archive_path = os.path.join(self.directory, "config.zip")
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            archive.write(DefaultConfigParserWrapper.test_config, "a.cfg")
+        source = ArchiveSource(archive_path)
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("integer", "values", is_digit=True), 1)
+        self.assertFalse(self.cfg.read_source(source))
+
+        os.utime(archive_path, (1000000000, 1000000000))
+        self.assertTrue(self.cfg.read_source(source))
+
+    def test_tar_archive_source(self):
+        file_path = os.path.join(self.directory, "a.cfg")
+        self._write_config(file_path, "tar", 1000000000)
+        archive_path = os.path.join(self.directory, "config.tar.gz")
+        with tarfile.open(archive_path, "w:gz") as archive:
+            archive.add(file_path, "a.cfg")
+        source = ArchiveSource(archive_path)
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("string", "values"), "tar")
+        self.assertFalse(self.cfg.read_source(source))
+
+    def test_http_source(self):
+        source, pool = self._start_server()
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("float", "values", is_digit=True), 5.6)
+        self.assertFalse(self.cfg.read_source(source))
+        self.assertEqual(sum(len(idle) for idle in pool._idle.values()), 1)
+
+        ConfigHandler.etag = '"2"'
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertFalse(self.cfg.read_source(source))
+
+    def test_http_source_error(self):
+        source, pool = self._start_server()
+        self.assertTrue(self.cfg.read_source(source))
+
+        ConfigHandler.status = 500
+        self.assertRaises(Exception, self.cfg.read_source, source)
+        self.assertEqual(self.cfg.get_value("string", "values"), "test string")
+
+        # the failed fetch resets the ETag, so the next one is unconditional
+        ConfigHandler.status = 200
+        self.assertTrue(self.cfg.read_source(source))
+
+    def test_http_source_stale_connection(self):
+        source, pool = self._start_server()
+        ConfigHandler.drop_connection = True
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(sum(len(idle) for idle in pool._idle.values()), 1)
+
+        ConfigHandler.etag = '"2"'
+        self.assertTrue(self.cfg.read_source(source))
+        self.assertEqual(self.cfg.get_value("string", "values"), "test string")
+
 
 if __name__ == '__main__':
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestConfigParserMethods)
+    suite = unittest.TestSuite()
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestConfigParserMethods))
+    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestConfigSources))
     unittest.TextTestRunner(verbosity=2, buffer=True).run(suite)